@@ -1,50 +1,59 @@
-from datetime import timedelta
-from dateutil import parser as timeparser
-import json
+from collections import defaultdict
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
 
 from jinja2 import Environment, FileSystemLoader
+from numba import njit
+import numpy as np
+import orjson
 from ortools.sat.python.cp_model import CpModel, CpSolver
 
 
-# Estimated venue transit times (by bicycle and allowing some time for parking)
-transit_times = {
-    "STA": {
-        "CAM": 20,
-        "EVR": 15,
-        "FLH": 15,
-        "VUE": 15,
-    },
-    "CAM": {
-        "EVR": 20,
-        "FLH": 10,
-        "STA": 20,
-        "VUE": 30,
-    },
-    "EVR": {
-        "CAM": 20,
-        "FLH": 20,
-        "STA": 15,
-        "VUE": 10,
-    },
-    "FLH": {
-        "CAM": 10,
-        "EVR": 20,
-        "STA": 15,
-        "VUE": 30,
-    },
-    "VUE": {
-        "CAM": 30,
-        "EVR": 10,
-        "FLH": 30,
-        "STA": 15,
-    },
-}
-for prev, times in transit_times.items():
-    for next in times.keys():
-        assert transit_times[prev][next] == transit_times[next][prev]
+# Estimated venue transit times (by bicycle and allowing some time for
+# parking), listed once per venue pair
+TRANSIT_EDGES = [
+    ("STA", "CAM", 20),
+    ("STA", "EVR", 15),
+    ("STA", "FLH", 15),
+    ("STA", "VUE", 15),
+    ("CAM", "EVR", 20),
+    ("CAM", "FLH", 10),
+    ("CAM", "VUE", 30),
+    ("EVR", "FLH", 20),
+    ("EVR", "VUE", 10),
+    ("FLH", "VUE", 30),
+]
+
+# Transit matrix indexed by venue ordinal: symmetric by construction, with
+# the diagonal holding the five-minute gap allowed between same-venue events
+VENUE_IDX = {"CAM": 0, "EVR": 1, "FLH": 2, "STA": 3, "VUE": 4}
+TRANSIT = [[5] * len(VENUE_IDX) for _ in VENUE_IDX]
+for a, b, minutes in TRANSIT_EDGES:
+    i, j = VENUE_IDX[a], VENUE_IDX[b]
+    TRANSIT[i][j] = TRANSIT[j][i] = minutes
+TRANSIT_NP = np.array(TRANSIT, np.int32)
+
+
+@njit(cache=True)
+def transit_pairs(vid, day_ord, transit_matrix):
+    """Enumerate (i, j, transit) triples for each ordered same-day event pair."""
+    n = vid.shape[0]
+    out = np.empty((n * (n - 1) // 2, 3), np.int32)
+    k = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            if day_ord[i] != day_ord[j]:
+                continue
+            out[k, 0] = i
+            out[k, 1] = j
+            out[k, 2] = transit_matrix[vid[i], vid[j]]
+            k += 1
+    return out[:k]
 
 
 class Venue(object):
+    __slots__ = ("id", "name")
+
     def __init__(self, id, name):
         self.id = id
         self.name = name
@@ -59,28 +68,40 @@ venues = {
 }
 
 
+# Film titles, interned to small integer identifiers
+title_ids = {}
+
+
 class Event(object):
+    __slots__ = (
+        "title",
+        "title_id",
+        "begin",
+        "begin_min",
+        "end_min",
+        "day_ord",
+        "venue",
+        "vid",
+        "url",
+        "description",
+    )
+
     def __init__(self, title, begin, running_time, venue_id, url, description):
         self.title = title
-        self.begin = timeparser.parse(begin)
-        self.running_time = timedelta(minutes=running_time)
-        self.end = self.begin + self.running_time
+        self.title_id = title_ids.setdefault(title, len(title_ids))
+        self.begin = datetime.fromisoformat(begin)
+        self.begin_min = int(self.begin.timestamp() // 60)
+        self.end_min = self.begin_min + running_time
+        self.day_ord = self.begin.toordinal()
         self.venue = venues[venue_id]
+        self.vid = VENUE_IDX[venue_id]
         self.url = url
         self.description = description
 
-    def minutes_from(self, prev: "Event"):
-        if self.venue == prev.venue:
-            return 5
-        return transit_times[prev.venue.id][self.venue.id]
-
-    def eta_from(self, prev: "Event"):
-        return prev.end + timedelta(minutes=self.minutes_from(prev))
-
 
 # Screenings, sorted by start time
 events = []
-for event_data in json.loads(open("events.json", "r").read()):
+for event_data in orjson.loads(open("events.json", "rb").read()):
     for occurrence_data in event_data["occurrences"]:
         events.append(
             Event(
@@ -93,77 +114,184 @@ for event_data in json.loads(open("events.json", "r").read()):
             )
         )
 events = sorted(events, key=lambda f: f.begin)
-n = len(events)
-
-model = CpModel()
-attendance = model.NewIntVar(0, n, "attendance")
-appearances = [model.NewBoolVar(f"appearances[{i}]") for i in range(n)]
-commute = model.NewIntVar(0, 3600, "commute")
-transits = [model.NewIntVar(0, 60, f"transits[{i}]") for i in range(n)]
-
-model.Add(attendance == sum(appearances))
-model.Add(commute == sum(transits))
-
-
-# Constraints:
-#
-#  - Events must not overlap
-#  - There must be enough time to transit between events
-#  - Avoid duplicate events (based on title)
-#
-for i in range(n):
-    for j in range(n):
-        if i < j:
-            chosen = [appearances[i], appearances[j]]
-            prev, next = events[i], events[j]
-            model.Add(next.begin >= prev.eta_from(prev)).OnlyEnforceIf(chosen)
-            model.Add(next.title != prev.title).OnlyEnforceIf(chosen)
-
-            # Don't add transit-related constraints across date boundaries
-            if prev.begin.date() != next.begin.date():
-                continue
 
-            # Add transit time constraints
-            adjacent = [appearances[b].Not() for b in range(i + 1, j)]
-            duration = next.minutes_from(prev)
-            model.Add(transits[j] == duration).OnlyEnforceIf(chosen + adjacent)
-
-solver = CpSolver()
-
-# Goal 1: maximize attendance
-model.Maximize(attendance)
-solver.Solve(model)
-
-# Goal 2: minimize commute (while maintaining attendance target)
-model.Add(attendance == solver.Value(attendance))
-model.Minimize(commute)
-solver.Solve(model)
-
-dates = {}
-for i in range(n):
-    if not solver.Value(appearances[i]):
-        continue
-    event = events[i]
-    date = event.begin.date().strftime("%Y-%m-%d")
-    if date not in dates:
-        dates[date] = {
-            "heading": event.begin.strftime("%d %b"),
-            "is_weekend": event.begin.weekday() in [5, 6],
-            "events": [],
-        }
-    dates[date]["events"].append(
-        {
-            "time": event.begin.strftime("%H:%M"),
-            "title": event.title,
-            "venue": event.venue.name,
-            "url": event.url,
-            "description": event.description,
-        }
-    )
+# The schedule is separable by date: overlap and transit constraints never
+# span midnight, so each festival day can be solved as its own (much
+# smaller) model, and the days solved in parallel
+events_by_day = defaultdict(list)
+for event in events:
+    events_by_day[event.day_ord].append(event)
+days = [events_by_day[day_ord] for day_ord in sorted(events_by_day)]
+
+
+def build_model(events):
+    """Build the attendance/commute model over the given events.
+
+    Events must be sorted by start time, but may span any number of
+    festival days.  Returns the model along with its appearance literals
+    and attendance variable.
+    """
+    n = len(events)
+
+    model = CpModel()
+    attendance = model.NewIntVar(0, n, "attendance")
+    appearances = [model.NewBoolVar(f"appearances[{i}]") for i in range(n)]
+    commute = model.NewIntVar(0, 3600, "commute")
+    transits = [model.NewIntVar(0, 60, f"transits[{i}]") for i in range(n)]
+
+    model.Add(attendance == sum(appearances))
+    model.Add(commute == sum(transits))
+
+    # Constraints:
+    #
+    #  - Events must not overlap
+    #  - There must be enough time to transit between events
+    #  - Avoid duplicate events (based on title)
+    #
+    # Each attended event occupies an interval spanning its running time
+    # plus the transit away from its venue afterwards; a no-overlap
+    # constraint per festival day then enforces both the overlap and the
+    # transit rules with the solver's disjunctive propagator.
+    day_ord = np.fromiter((event.day_ord for event in events), np.int32, n)
+    intervals = [
+        model.NewOptionalIntervalVar(
+            event.begin_min,
+            (event.end_min - event.begin_min) + transits[i],
+            event.end_min + transits[i],
+            appearances[i],
+            f"intervals[{i}]",
+        )
+        for i, event in enumerate(events)
+    ]
+    for day in np.unique(day_ord):
+        model.AddNoOverlap([intervals[i] for i in np.flatnonzero(day_ord == day)])
+
+    # Attend at most one screening of each film
+    by_title = defaultdict(list)
+    for i, event in enumerate(events):
+        by_title[event.title_id].append(appearances[i])
+    for group in by_title.values():
+        if len(group) > 1:
+            model.AddAtMostOne(group)
+
+    # attended[k] counts attendances among the first k events; two chosen
+    # events are consecutive exactly when the count is unchanged between them
+    attended = [model.NewIntVar(0, n, f"attended[{k}]") for k in range(n + 1)]
+    model.Add(attended[0] == 0)
+    for i in range(n):
+        model.Add(attended[i + 1] == attended[i] + appearances[i])
+
+    # Each event's outgoing transit time is determined by the venue of the
+    # next event attended on the same day (events are sorted by start time,
+    # so candidate successors always appear later in the sequence); the
+    # pair/transit enumeration itself runs in compiled code
+    vid = np.fromiter((event.vid for event in events), np.int32, n)
+    for i, j, minutes in transit_pairs(vid, day_ord, TRANSIT_NP).tolist():
+        consecutive = model.NewBoolVar(f"consecutive[{i},{j}]")
+        model.Add(attended[j] == attended[i + 1]).OnlyEnforceIf(consecutive)
+        model.Add(attended[j] > attended[i + 1]).OnlyEnforceIf(consecutive.Not())
+        chosen = [appearances[i], appearances[j], consecutive]
+        model.Add(transits[i] == minutes).OnlyEnforceIf(chosen)
+
+    # Goals, in priority order: maximize attendance, then minimize commute.
+    # Weighting attendance beyond the commute upper bound folds both goals
+    # into one objective, so a single solve (and single presolve) suffices.
+    model.Minimize(commute - 3601 * attendance)
+
+    return model, appearances, attendance
+
+
+def solve(model, appearances, events, num_workers=1):
+    """Solve a built model and return the events chosen for attendance.
+
+    The per-day submodels run one searcher each (parallelism comes from
+    the process pool); the festival-wide solve may use more.
+    """
+    solver = CpSolver()
+    solver.parameters.num_workers = num_workers
+    solver.Solve(model)
+
+    # Fetch the solution vector in one pass rather than querying the
+    # solver wrapper once per variable
+    solution = solver.ResponseProto().solution
+    return [
+        event
+        for i, event in enumerate(events)
+        if solution[appearances[i].Index()]
+    ]
+
+
+def solve_day(args):
+    """Choose the events to attend on a single festival day.
+
+    Accepts a (events, banned_titles) tuple: the day's candidate events in
+    start-time order, and the title identifiers of any films already
+    attended on earlier days.  Returns the list of events to attend.
+    """
+    events, banned_titles = args
+    model, appearances, attendance = build_model(events)
+    for i, event in enumerate(events):
+        if event.title_id in banned_titles:
+            model.Add(appearances[i] == 0)
+    return solve(model, appearances, events)
+
+
+def main():
+    with Pool(processes=min(len(days), cpu_count())) as pool:
+        schedules = pool.map(solve_day, [(day, frozenset()) for day in days])
+
+    # The per-day submodels can't see each other's title selections, so
+    # re-solve any day whose schedule repeats a title attended earlier
+    seen_titles = set()
+    for d, schedule in enumerate(schedules):
+        titles = {event.title_id for event in schedule}
+        if titles & seen_titles:
+            schedules[d] = schedule = solve_day((days[d], frozenset(seen_titles)))
+            titles = {event.title_id for event in schedule}
+        seen_titles |= titles
+
+    # Each day's model settles its commute before later days' title choices
+    # are known, so the combined schedule can miss the festival-wide
+    # optimum.  A final solve over the whole festival restores it, starting
+    # from the per-day schedules as solution hints and requiring at least
+    # their combined attendance.
+    model, appearances, attendance = build_model(events)
+    attending = {
+        (event.begin_min, event.vid)
+        for schedule in schedules
+        for event in schedule
+    }
+    model.Add(attendance >= len(attending))
+    for i, event in enumerate(events):
+        model.AddHint(appearances[i], (event.begin_min, event.vid) in attending)
+    schedule = solve(model, appearances, events, num_workers=8)
+
+    dates = {}
+    for event in schedule:
+        date = event.begin.date().strftime("%Y-%m-%d")
+        if date not in dates:
+            dates[date] = {
+                "heading": event.begin.strftime("%d %b"),
+                "is_weekend": event.begin.weekday() in [5, 6],
+                "events": [],
+            }
+        dates[date]["events"].append(
+            {
+                "time": event.begin.strftime("%H:%M"),
+                "title": event.title,
+                "venue": event.venue.name,
+                "url": event.url,
+                "description": event.description,
+            }
+        )
+
+    # Render the suggested schedule using an HTML template
+    env = Environment(loader=FileSystemLoader("."))
+    template = env.get_template("schedule.html")
+    html = template.render(dates=dates)
+
+    print(html)
 
-# Render the suggested schedule using an HTML template
-env = Environment(loader=FileSystemLoader("."))
-template = env.get_template("schedule.html")
-html = template.render(dates=dates)
 
-print(html)
+if __name__ == "__main__":
+    main()